@@ -0,0 +1,209 @@
+"""
+Read Routing Benchmark
+
+This script measures how routing read-only inventory queries away from the primary affects read throughput and
+write latency. It drives MongoIMS itself: the connection profiles are loaded by load_connection_profiles, writer
+threads call update_collection_data (write profile, on the primary) and reader threads call
+get_inventory_from_cili (read profile) on one large scratch site. The workload runs twice, first with the read
+profile on the primary and then with the given read preference. Run it against a scratch replica set, e.g.:
+
+    python benchmarks/read_routing.py --uri "mongodb://localhost:27017,localhost:27018,localhost:27019/?replicaSet=rs0"
+
+The scratch site is written to the 'inventory_db' database used by the application and removed afterwards.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "src"))
+from src.mongodb import MongoIMS
+from src.schemas import inventory_categories
+
+SITE = "BENCHSITE"
+
+
+def build_credentials(args, read_preference):
+    """
+    Build the MongoIMS settings of a benchmark run.
+
+    Args:
+        args (argparse.Namespace): The benchmark options.
+        read_preference (str): The read preference of the read profile.
+
+    Returns:
+        dict: The settings, in the format of the 'mongodb' secrets section.
+    """
+    options = {"maxPoolSize": args.max_pool_size}
+    if args.compressors:
+        options["compressors"] = args.compressors
+    return {
+        "uri": args.uri,
+        "use_read_model": args.read_model,
+        "profiles": {
+            "write": dict(options),
+            "read": {**options, "readPreference": read_preference},
+        },
+    }
+
+
+def seed(database, rows):
+    """
+    Create the scratch site inventory.
+
+    Args:
+        database (MongoIMS): The MongoIMS instance of the run.
+        rows (int): The number of fiber items of the site.
+
+    Returns:
+        list: The '_id' values of the seeded items.
+    """
+    cleanup(database)
+    stamp = database.version_stamp()
+    result = database.collection["fiber"].insert_many(
+        {
+            "cordage": "DUPLEX",
+            "type": random.choice(["SMF", "MMF"]),
+            "conn1": "LC",
+            "conn2": random.choice(["LC", "SC"]),
+            "length": f"{i % 50 + 1}M",
+            "quantity": random.randint(0, 100),
+            "site_cili": SITE,
+            **stamp,
+        }
+        for i in range(rows)
+    )
+    database.sync_site_inventory(SITE)
+    return result.inserted_ids
+
+
+def cleanup(database):
+    """
+    Remove the scratch site inventory.
+
+    Args:
+        database (MongoIMS): The MongoIMS instance of the run.
+    """
+    for category in inventory_categories:
+        database.collection[category].delete_many({"site_cili": SITE})
+    database.collection["site_inventory"].delete_many({"cili": SITE})
+
+
+def percentile(samples, fraction):
+    """
+    Get a percentile of latency samples.
+
+    Args:
+        samples (list): The latency samples, in seconds.
+        fraction (float): The percentile, between 0 and 1.
+
+    Returns:
+        float: The percentile in milliseconds.
+    """
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000
+
+
+def run(database, ids, args):
+    """
+    Run the mixed read/write workload.
+
+    Args:
+        database (MongoIMS): The MongoIMS instance of the run.
+        ids (list): The '_id' values of the seeded items.
+        args (argparse.Namespace): The benchmark options.
+
+    Returns:
+        dict: The write latencies and the number of completed site reads.
+    """
+    write_latencies = []
+    reads = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.duration
+
+    def writer():
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            database.update_collection_data(
+                "fiber",
+                0,
+                random.randint(0, 100),
+                {"_id": random.choice(ids), "site_cili": SITE},
+            )
+            with lock:
+                write_latencies.append(time.perf_counter() - start)
+
+    def reader():
+        while time.perf_counter() < deadline:
+            database.get_inventory_from_cili(SITE)
+            with lock:
+                reads[0] += 1
+
+    threads = [threading.Thread(target=writer) for _ in range(args.writers)]
+    threads += [threading.Thread(target=reader) for _ in range(args.readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {"write_latencies": write_latencies, "reads": reads[0]}
+
+
+def report(name, result, duration):
+    """
+    Print the results of a workload run.
+
+    Args:
+        name (str): The name of the run.
+        result (dict): The results returned by run().
+        duration (float): The duration of the run in seconds.
+    """
+    latencies = result["write_latencies"]
+    print(
+        f"{name:<24} reads/s {result['reads'] / duration:8.1f}   "
+        f"writes/s {len(latencies) / duration:8.1f}   "
+        f"write p50 {percentile(latencies, 0.5):6.2f} ms   "
+        f"p95 {percentile(latencies, 0.95):6.2f} ms   "
+        f"p99 {percentile(latencies, 0.99):6.2f} ms   "
+        f"mean {statistics.fmean(latencies) * 1000 if latencies else 0:6.2f} ms"
+    )
+
+
+def main():
+    """
+    Parse the options and compare primary reads with routed reads.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--uri", required=True, help="Replica set connection URI.")
+    parser.add_argument("--read-preference", default="secondaryPreferred")
+    parser.add_argument(
+        "--read-model", action="store_true", help="Serve reads from site_inventory."
+    )
+    parser.add_argument("--max-pool-size", type=int, default=100)
+    parser.add_argument("--compressors", default=None, help="e.g. zlib")
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=20.0)
+    args = parser.parse_args()
+
+    primary = MongoIMS(build_credentials(args, "primary"))
+    routed = MongoIMS(build_credentials(args, args.read_preference))
+    ids = seed(primary, args.rows)
+    time.sleep(1)
+    try:
+        report("reads on primary", run(primary, ids, args), args.duration)
+        report(f"reads {args.read_preference}", run(routed, ids, args), args.duration)
+    finally:
+        cleanup(primary)
+
+
+if __name__ == "__main__":
+    main()
@@ -15,7 +15,7 @@ import streamlit as st
 from streamlit_option_menu import option_menu
 
 sys.path.append("src/")
-from src import mongodb, pages, schemas
+from src import live, manual_search, mongodb, pages, schemas
 
 st.set_page_config(
     layout="wide",
@@ -24,6 +24,11 @@ st.set_page_config(
 )
 st.markdown(schemas.page_bg_img, unsafe_allow_html=True)
 inventory_db = mongodb.MongoIMS(st.secrets.mongodb)
+inventory_watcher = (
+    live.get_inventory_watcher(inventory_db)
+    if st.secrets.mongodb.get("live_updates", False)
+    else None
+)
 
 if __name__ == "__main__":
     selected = option_menu(
@@ -38,5 +43,19 @@ if __name__ == "__main__":
     if selected == "Home":
         pages.home_page()
 
+    if selected == "Chat Bot":
+        manuals = st.secrets.get("manuals", {})
+        pages.chat_bot_page(
+            manual_search.load_manual_index(
+                manuals.get("path", "manuals"),
+                manuals.get("index_path", "manual_index"),
+            )
+        )
+
+    if selected == "Port Manager":
+        pages.port_manager_page(inventory_db)
+
     if selected == "Inventory":
-        pages.inventory_page(inventory_db)
+        pages.inventory_page(inventory_db, inventory_watcher)
+    elif inventory_watcher is not None:
+        inventory_watcher.unsubscribe()
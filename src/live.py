@@ -0,0 +1,406 @@
+"""
+Live Inventory - Shared Inventory Cache and Change Watcher
+
+This script defines a process-wide cache of site inventories and a background watcher that keeps it current.
+The watcher follows the inventory collections through MongoDB change streams and falls back to polling the
+version stamps written by MongoIMS when the server does not support change streams (standalone/local servers).
+Sessions viewing a site are asked to rerun whenever that site changes.
+"""
+
+import threading
+import time
+
+import pymongo
+import streamlit as st
+
+from src.schemas import inventory_categories
+from src.utils import has_inventory_changes, patch_inventory_frame
+
+
+@st.cache_resource
+def get_inventory_watcher(_database):
+    """
+    Start the inventory watcher shared by every session of the application.
+
+    Args:
+        _database (MongoIMS): An instance of the MongoIMS class for managing inventory data.
+
+    Returns:
+        InventoryWatcher: The running inventory watcher.
+    """
+    watcher = InventoryWatcher(_database)
+    watcher.start()
+    return watcher
+
+
+def request_session_rerun(session_id):
+    """
+    Ask an open Streamlit session to rerun its script.
+
+    Args:
+        session_id (str): The id of the session to rerun.
+
+    Returns:
+        bool: True if the rerun was requested, False if the session is gone or the runtime is unavailable.
+
+    Note:
+        This relies on the Streamlit runtime internals; when they are unavailable the session simply
+        picks up the refreshed cache on its next interaction.
+    """
+    try:
+        from streamlit.runtime import Runtime
+
+        session_info = Runtime.instance()._session_mgr.get_active_session_info(
+            session_id
+        )
+        if session_info is None:
+            return False
+        session = session_info.session
+        session._event_loop.call_soon_threadsafe(session.request_rerun, None)
+        return True
+    except Exception as e:
+        print("Could not request a session rerun:", str(e))
+        return False
+
+
+def get_session_id():
+    """
+    Get the id of the Streamlit session running the current script.
+
+    Returns:
+        str: The session id, or None outside of a Streamlit script run.
+    """
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx else None
+
+
+class SiteInventoryCache:
+    """
+    SiteInventoryCache - In-process cache of site inventories
+
+    This class holds the inventory frames of every site requested so far together with the version they
+    reflect, and patches them with the rows changed since that version when a site is refreshed.
+
+    Attributes:
+        database (MongoIMS): An instance of the MongoIMS class for managing inventory data.
+    """
+
+    def __init__(self, database):
+        """
+        Initialize an empty cache.
+
+        Args:
+            database (MongoIMS): An instance of the MongoIMS class for managing inventory data.
+        """
+        self.database = database
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._sites = {}
+        self._cilis = None
+
+    def get(self, cili):
+        """
+        Get the inventory of a site, loading it from the database on a cache miss.
+
+        The snapshot is read from the primary, like the refreshes patching it: a lagging secondary
+        could return a version older than writes the watcher has already handled. A new snapshot is
+        refreshed once after it is stored, since the watcher skips sites that are not cached yet and
+        could have handled a write made while the snapshot was read.
+
+        Args:
+            cili (str): The CILI value of the site.
+
+        Returns:
+            tuple: A tuple containing dataframes for fiber, optic, and misc inventory (metadata columns included).
+        """
+        with self._lock:
+            entry = self._sites.get(cili)
+        if entry is None:
+            frames, version = self.database.get_inventory_snapshot(cili, primary=True)
+            with self._lock:
+                self._sites.setdefault(cili, {"frames": frames, "version": version})
+            self.refresh(cili)
+            with self._lock:
+                entry = self._sites[cili]
+        return entry["frames"]
+
+    def get_cilis(self):
+        """
+        Get the list of site CILI values, loading it from the database when it has been invalidated.
+
+        Returns:
+            list: A list of distinct "cili" values.
+        """
+        cilis = self._cilis
+        if cilis is None:
+            cilis = self.database.get_cilis()
+            self._cilis = cilis
+        return cilis
+
+    def invalidate_cilis(self):
+        """
+        Drop the cached list of sites so that it is reloaded on the next request.
+        """
+        self._cilis = None
+
+    def cached_cilis(self):
+        """
+        Get the CILI values of the sites currently held in the cache.
+
+        Returns:
+            list: A list of cached "cili" values.
+        """
+        with self._lock:
+            return list(self._sites)
+
+    def refresh(self, cili):
+        """
+        Patch the cached inventory of a site with the rows written since its cached version.
+
+        Rows re-read from the catch-up window of get_inventory_changes_since are ignored when they
+        are already cached at the same or a newer version. Changes are read from the primary: the watcher has
+        just seen them there and a lagging secondary could hide them until the next write to the site.
+
+        Args:
+            cili (str): The CILI value of the site.
+
+        Returns:
+            bool: True if the cached inventory changed.
+
+        Note:
+            Refreshes are serialized so that a slower refresh cannot store its result over a later one.
+        """
+        with self._refresh_lock:
+            with self._lock:
+                entry = self._sites.get(cili)
+            if entry is None:
+                return False
+            changes, removed, version = self.database.get_inventory_changes_since(
+                cili, entry["version"], primary=True
+            )
+            changed = any(
+                has_inventory_changes(frame, changes[category], removed[category])
+                for category, frame in zip(inventory_categories, entry["frames"])
+            )
+            if not changed:
+                return False
+            frames = tuple(
+                patch_inventory_frame(frame, changes[category], removed[category])
+                for category, frame in zip(inventory_categories, entry["frames"])
+            )
+            with self._lock:
+                self._sites[cili] = {"frames": frames, "version": version}
+            return True
+
+
+class InventoryWatcher:
+    """
+    InventoryWatcher - Background watcher of the inventory collections
+
+    This class runs a daemon thread that follows writes to the site and inventory collections, refreshes the
+    shared SiteInventoryCache for the affected sites and asks the sessions viewing those sites to rerun.
+
+    Attributes:
+        database (MongoIMS): An instance of the MongoIMS class for managing inventory data.
+        cache (SiteInventoryCache): The shared inventory cache kept current by the watcher.
+        poll_interval (float): Seconds between polls when change streams are unavailable.
+        mode (str): 'change_stream' or 'polling' once the watcher is running.
+    """
+
+    def __init__(self, database, poll_interval=2.0):
+        """
+        Initialize the watcher.
+
+        Args:
+            database (MongoIMS): An instance of the MongoIMS class for managing inventory data.
+            poll_interval (float, optional): Seconds between polls when change streams are unavailable.
+        """
+        self.database = database
+        self.cache = SiteInventoryCache(database)
+        self.poll_interval = poll_interval
+        self.mode = None
+        self._subscribers = {}
+        self._subscribers_lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """
+        Start the watcher thread.
+        """
+        self._thread = threading.Thread(
+            target=self.run, name="inventory-watcher", daemon=True
+        )
+        self._thread.start()
+
+    def subscribe(self, cili):
+        """
+        Register the current session as viewing a site.
+
+        Args:
+            cili (str): The CILI value of the site being viewed.
+        """
+        session_id = get_session_id()
+        if session_id is not None:
+            with self._subscribers_lock:
+                self._subscribers[session_id] = cili
+
+    def unsubscribe(self):
+        """
+        Stop pushing refreshes to the current session.
+        """
+        session_id = get_session_id()
+        with self._subscribers_lock:
+            self._subscribers.pop(session_id, None)
+
+    def run(self):
+        """
+        Follow the collections with change streams, falling back to polling when they are not supported.
+        """
+        try:
+            self.watch_change_streams()
+        except pymongo.errors.OperationFailure as e:
+            print("Change streams unavailable, polling for changes:", str(e))
+            self.poll()
+
+    def watched_collections(self):
+        """
+        Get the names of the collections followed by the watcher.
+
+        Returns:
+            dict: A dictionary mapping collection names to their category.
+        """
+        categories = (
+            ("site",)
+            + inventory_categories
+            + tuple(f"{category}_archive" for category in inventory_categories)
+        )
+        return {self.database.collection[c].name: c for c in categories}
+
+    def watch_change_streams(self):
+        """
+        Follow the collections through a database change stream, resuming after transient errors.
+
+        Deletes are not followed: items only leave the category collections through archival,
+        which shows up as inserts into the archive collections. Whenever the stream is opened
+        without a resume token, writes made while it was closed are missed, so every cached site
+        is refreshed once the stream is open.
+        """
+        watched = self.watched_collections()
+        db = self.database.collection["site"].database
+        pipeline = [
+            {
+                "$match": {
+                    "ns.coll": {"$in": list(watched)},
+                    "operationType": {"$in": ["insert", "update", "replace"]},
+                }
+            }
+        ]
+        resume_token = None
+        while True:
+            try:
+                with db.watch(
+                    pipeline, full_document="updateLookup", resume_after=resume_token
+                ) as stream:
+                    self.mode = "change_stream"
+                    if resume_token is None:
+                        self.cache.invalidate_cilis()
+                        self.refresh_sites(self.cache.cached_cilis())
+                    for change in stream:
+                        resume_token = stream.resume_token
+                        self.handle_change(watched[change["ns"]["coll"]], change)
+            except pymongo.errors.OperationFailure:
+                if self.mode is None:
+                    raise
+                print("Change stream interrupted, resuming.")
+                resume_token = None
+            except pymongo.errors.PyMongoError as e:
+                print("Change stream error, retrying:", str(e))
+                time.sleep(self.poll_interval)
+
+    def handle_change(self, category, change):
+        """
+        Refresh the cache for a single change stream event.
+
+        Args:
+            category (str): The category of the collection that changed.
+            change (dict): The change stream event.
+        """
+        document = change.get("fullDocument") or {}
+        if category == "site":
+            self.cache.invalidate_cilis()
+            self.notify(self.cache.cached_cilis())
+        elif document.get("site_cili") is not None:
+            self.refresh_sites([document["site_cili"]])
+        else:
+            self.refresh_sites(self.cache.cached_cilis())
+
+    def poll(self):
+        """
+        Poll the version stamps of the collections and refresh the sites written since the last poll.
+
+        Versions are allocated before the write commits, so each poll re-reads the last
+        'version_window' versions of the database and only refreshes the sites of documents
+        it has not seen at that version yet.
+        """
+        self.mode = "polling"
+        watched = self.watched_collections()
+        window = self.database.version_window
+        last_version = self.database.current_version()
+        seen = set()
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                since = max(0, last_version - window)
+                changed_cilis = set()
+                for category in watched.values():
+                    documents = self.database.collection[category].find(
+                        {"version": {"$gt": since}},
+                        {"site_cili": 1, "cili": 1, "version": 1},
+                    )
+                    for document in documents:
+                        key = (category, document["_id"], document["version"])
+                        if key in seen:
+                            continue
+                        seen.add(key)
+                        last_version = max(last_version, document["version"])
+                        if category == "site":
+                            self.cache.invalidate_cilis()
+                            changed_cilis.add(document["cili"])
+                        else:
+                            changed_cilis.add(document["site_cili"])
+                since = max(0, last_version - window)
+                seen = {key for key in seen if key[2] > since}
+                self.refresh_sites(changed_cilis)
+            except pymongo.errors.PyMongoError as e:
+                print("Polling error, retrying:", str(e))
+
+    def refresh_sites(self, cilis):
+        """
+        Refresh the cached inventory of sites and notify the sessions viewing the ones that changed.
+
+        Args:
+            cilis (iterable): The CILI values of the sites to refresh.
+        """
+        self.notify([cili for cili in cilis if self.cache.refresh(cili)])
+
+    def notify(self, cilis):
+        """
+        Ask the sessions viewing any of the given sites to rerun.
+
+        Args:
+            cilis (list): The CILI values of the sites that changed.
+        """
+        if not cilis:
+            return
+        with self._subscribers_lock:
+            subscribers = [
+                session_id
+                for session_id, cili in self._subscribers.items()
+                if cili in cilis
+            ]
+        for session_id in subscribers:
+            if not request_session_rerun(session_id):
+                with self._subscribers_lock:
+                    self._subscribers.pop(session_id, None)
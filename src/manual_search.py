@@ -0,0 +1,483 @@
+"""
+Manual Search - Offline BM25 Search over Equipment Manuals
+
+This script defines a local search engine over a directory of PDF and text manuals. Every manual is split into
+passages and indexed into its own BM25 index segment, stored as NumPy files that are memory-mapped at query time,
+so searching needs no network service and only touches the terms, postings and passage text it needs.
+Re-indexing only rebuilds the segments of files that changed since the last run.
+"""
+
+import hashlib
+import json
+import math
+import os
+import re
+import shutil
+import threading
+
+import numpy as np
+import streamlit as st
+
+MANUAL_EXTENSIONS = (".pdf", ".txt", ".md")
+PASSAGE_WORDS = 200
+STOP_WORDS = set(
+    "a an and are as at be by for from in is it of on or that the this to with".split()
+)
+
+
+@st.cache_resource
+def load_manual_index(manuals_path, index_path):
+    """
+    Load the manual index shared by every session, indexing new or changed manuals first.
+
+    Args:
+        manuals_path (str): The directory containing the manuals.
+        index_path (str): The directory where the index files are stored.
+
+    Returns:
+        ManualIndex: The loaded manual index.
+    """
+    index = ManualIndex(manuals_path, index_path)
+    index.update()
+    return index
+
+
+def tokenize(text):
+    """
+    Split text into lowercase search terms, dropping stop words.
+
+    Args:
+        text (str): The text to tokenize.
+
+    Returns:
+        list: The search terms.
+    """
+    terms = re.findall(r"[a-z0-9]+", text.lower())
+    return [term for term in terms if term not in STOP_WORDS]
+
+
+def split_passages(text, words=PASSAGE_WORDS):
+    """
+    Split text into passages of a fixed number of words.
+
+    Args:
+        text (str): The text to split.
+        words (int, optional): The number of words per passage.
+
+    Returns:
+        list: The passages.
+    """
+    tokens = text.split()
+    return [" ".join(tokens[i : i + words]) for i in range(0, len(tokens), words)]
+
+
+def extract_pages(path):
+    """
+    Extract the text of a manual, page by page.
+
+    Args:
+        path (str): The path of the manual.
+
+    Returns:
+        list: The text of every page (text files are a single page).
+    """
+    if path.lower().endswith(".pdf"):
+        try:
+            from pypdf import PdfReader
+        except ImportError:
+            print("pypdf is not installed, skipping", path)
+            return []
+        try:
+            return [page.extract_text() or "" for page in PdfReader(path).pages]
+        except Exception as e:
+            print(f"Error: Could not read '{path}':", str(e))
+            return []
+    with open(path, encoding="utf-8", errors="ignore") as file:
+        return [file.read()]
+
+
+def extract_passages(path):
+    """
+    Extract the passages of a manual along with their term frequencies.
+
+    Args:
+        path (str): The path of the manual.
+
+    Returns:
+        list: A list of passages, each a dictionary with the 'page', 'text' and 'terms' (term frequencies).
+    """
+    passages = []
+    for page_number, page_text in enumerate(extract_pages(path), start=1):
+        for text in split_passages(page_text):
+            terms = {}
+            for term in tokenize(text):
+                terms[term] = terms.get(term, 0) + 1
+            if terms:
+                passages.append({"page": page_number, "text": text, "terms": terms})
+    return passages
+
+
+def write_json(path, data):
+    """
+    Atomically write a JSON file.
+
+    Args:
+        path (str): The path of the file.
+        data: The data to write.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(data, file)
+    os.replace(tmp_path, path)
+
+
+def build_segment(path, passages):
+    """
+    Write the index segment of a manual.
+
+    Args:
+        path (str): The directory of the segment; it must not exist yet.
+        passages (list): The passages of the manual, as returned by extract_passages.
+
+    Segment files:
+        terms.npy: The sorted terms of the manual, as fixed-width bytes.
+        term_offsets.npy: The start of the postings of every term, followed by the number of postings.
+        postings_docs.npy, postings_tf.npy: The passage ids and term frequencies of every term, concatenated.
+        passage_lengths.npy: The number of terms of every passage.
+        pages.npy: The page of every passage.
+        text.bin, text_offsets.npy: The UTF-8 text of every passage, concatenated, and its offsets.
+    """
+    postings = {}
+    for passage_id, passage in enumerate(passages):
+        for term, tf in passage["terms"].items():
+            postings.setdefault(term, []).append((passage_id, tf))
+    terms = sorted(postings)
+    offsets = [0]
+    docs = []
+    tfs = []
+    for term in terms:
+        for passage_id, tf in postings[term]:
+            docs.append(passage_id)
+            tfs.append(min(tf, np.iinfo(np.uint16).max))
+        offsets.append(len(docs))
+    texts = [passage["text"].encode("utf-8") for passage in passages]
+
+    tmp_path = f"{path}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    arrays = {
+        "terms": np.array([term.encode("ascii") for term in terms]),
+        "term_offsets": np.array(offsets, dtype=np.int64),
+        "postings_docs": np.array(docs, dtype=np.uint32),
+        "postings_tf": np.array(tfs, dtype=np.uint16),
+        "passage_lengths": np.array(
+            [sum(passage["terms"].values()) for passage in passages], dtype=np.float32
+        ),
+        "pages": np.array([passage["page"] for passage in passages], dtype=np.uint32),
+        "text_offsets": np.cumsum([0] + [len(text) for text in texts], dtype=np.int64),
+    }
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_path, f"{name}.npy"), array)
+    with open(os.path.join(tmp_path, "text.bin"), "wb") as file:
+        file.write(b"".join(texts))
+    os.replace(tmp_path, path)
+
+
+def load_segment(path, relative_path):
+    """
+    Memory-map the index segment of a manual.
+
+    Args:
+        path (str): The directory of the segment.
+        relative_path (str): The path of the manual, relative to the manuals directory.
+
+    Returns:
+        dict: The memory-mapped segment arrays, with the 'file' of the manual.
+
+    Note:
+        The arrays are plain ndarray views of the mapped files; slicing np.memmap objects adds
+        a noticeable per-call overhead when a query touches every segment.
+    """
+    segment = {"file": relative_path}
+    for name in (
+        "terms",
+        "term_offsets",
+        "postings_docs",
+        "postings_tf",
+        "passage_lengths",
+        "pages",
+        "text_offsets",
+    ):
+        segment[name] = np.asarray(
+            np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+        )
+    segment["text"] = np.asarray(
+        np.memmap(os.path.join(path, "text.bin"), dtype=np.uint8, mode="r")
+    )
+    return segment
+
+
+def find_terms(segment, keys):
+    """
+    Find the postings of terms in an index segment.
+
+    Args:
+        segment (dict): The segment, as returned by load_segment.
+        keys (np.ndarray): The terms to find, as bytes.
+
+    Returns:
+        dict: The start and end of the postings of every term the manual contains, keyed by term.
+    """
+    terms = segment["terms"]
+    positions = np.searchsorted(terms, keys)
+    found = {}
+    for key, i in zip(keys.tolist(), positions.tolist()):
+        if i < len(terms) and terms[i] == key:
+            offsets = segment["term_offsets"]
+            found[key] = (int(offsets[i]), int(offsets[i + 1]))
+    return found
+
+
+class ManualIndex:
+    """
+    ManualIndex - Segmented BM25 index over a directory of manuals
+
+    This class maintains the index segments of a manuals directory and answers search queries against them.
+    Each manual has its own segment (see build_segment); queries look the terms up in every segment and
+    score them with collection-wide BM25 statistics kept in the manifest.
+
+    Index files:
+        manifest.json: The modification time, size, segment, passage count and total length of every manual.
+        segments/: One directory per indexed manual version.
+
+    Attributes:
+        manuals_path (str): The directory containing the manuals.
+        index_path (str): The directory where the index files are stored.
+        k1 (float): The BM25 term frequency saturation parameter.
+        b (float): The BM25 length normalization parameter.
+        state (dict): The loaded 'segments', 'passage_count' and 'average_length'. It is replaced as a
+            whole, never modified, so a search running during a re-index sees either the old or the new index.
+    """
+
+    def __init__(self, manuals_path, index_path, k1=1.2, b=0.75):
+        """
+        Initialize the index and load the index files if they exist.
+
+        Args:
+            manuals_path (str): The directory containing the manuals.
+            index_path (str): The directory where the index files are stored.
+            k1 (float, optional): The BM25 term frequency saturation parameter.
+            b (float, optional): The BM25 length normalization parameter.
+        """
+        self.manuals_path = manuals_path
+        self.index_path = index_path
+        self.k1 = k1
+        self.b = b
+        self.state = {"segments": [], "passage_count": 0, "average_length": 0.0}
+        self._update_lock = threading.Lock()
+        self.load()
+
+    def path(self, *names):
+        """
+        Build the path of a file of the index.
+
+        Args:
+            *names: The path components below the index directory.
+
+        Returns:
+            str: The path of the file.
+        """
+        return os.path.join(self.index_path, *names)
+
+    def read_manifest(self):
+        """
+        Read the manifest of the indexed manuals.
+
+        Returns:
+            dict: The manifest entries keyed by manual path, empty when nothing was indexed yet.
+        """
+        if not os.path.exists(self.path("manifest.json")):
+            return {}
+        with open(self.path("manifest.json"), encoding="utf-8") as file:
+            return json.load(file)
+
+    def load(self):
+        """
+        Load the index, memory-mapping the segment of every manual.
+
+        Manifest entries written before segments existed are skipped; update() indexes them again.
+        """
+        manifest = {
+            relative_path: entry
+            for relative_path, entry in self.read_manifest().items()
+            if "segment" in entry
+        }
+        segments = [
+            load_segment(self.path("segments", entry["segment"]), relative_path)
+            for relative_path, entry in sorted(manifest.items())
+            if entry["segment"]
+        ]
+        passage_count = sum(entry["passages"] for entry in manifest.values())
+        total_length = sum(entry["length"] for entry in manifest.values())
+        self.state = {
+            "segments": segments,
+            "passage_count": passage_count,
+            "average_length": total_length / passage_count if passage_count else 0.0,
+        }
+
+    def passage_count(self):
+        """
+        Get the number of indexed passages.
+
+        Returns:
+            int: The number of passages of the loaded index.
+        """
+        return self.state["passage_count"]
+
+    def manual_files(self):
+        """
+        List the manuals of the manuals directory.
+
+        Returns:
+            list: The paths of the manuals, relative to the manuals directory.
+        """
+        files = []
+        for root, _, names in os.walk(self.manuals_path):
+            for name in names:
+                if name.lower().endswith(MANUAL_EXTENSIONS):
+                    files.append(
+                        os.path.relpath(os.path.join(root, name), self.manuals_path)
+                    )
+        return sorted(files)
+
+    def update(self):
+        """
+        Re-index the manuals that were added, changed or removed since the last update.
+
+        Returns:
+            int: The number of manuals whose segment was built again.
+
+        Note:
+            Updates are serialized so that concurrent re-indexes do not write the same files. Changed
+            manuals get a new segment directory, and the segments they replace are only deleted after
+            the new index is loaded.
+        """
+        with self._update_lock:
+            os.makedirs(self.path("segments"), exist_ok=True)
+            manifest = self.read_manifest()
+            updated_manifest = {}
+            extracted = 0
+            for relative_path in self.manual_files():
+                stat = os.stat(os.path.join(self.manuals_path, relative_path))
+                entry = manifest.get(relative_path)
+                if (
+                    entry
+                    and "segment" in entry
+                    and entry["mtime"] == stat.st_mtime
+                    and entry["size"] == stat.st_size
+                ):
+                    updated_manifest[relative_path] = entry
+                    continue
+                passages = extract_passages(
+                    os.path.join(self.manuals_path, relative_path)
+                )
+                segment = None
+                if passages:
+                    key = f"{relative_path}:{stat.st_mtime}:{stat.st_size}"
+                    segment = hashlib.sha1(key.encode("utf-8")).hexdigest()
+                    if not os.path.exists(self.path("segments", segment)):
+                        build_segment(self.path("segments", segment), passages)
+                updated_manifest[relative_path] = {
+                    "mtime": stat.st_mtime,
+                    "size": stat.st_size,
+                    "segment": segment,
+                    "passages": len(passages),
+                    "length": sum(
+                        sum(passage["terms"].values()) for passage in passages
+                    ),
+                }
+                extracted += 1
+
+            if extracted or updated_manifest.keys() != manifest.keys():
+                write_json(self.path("manifest.json"), updated_manifest)
+                self.load()
+                self.remove_unused_files(updated_manifest)
+            return extracted
+
+    def remove_unused_files(self, manifest):
+        """
+        Delete the segments that are no longer in the manifest, and index files of older versions.
+
+        Args:
+            manifest (dict): The manifest of the indexed manuals.
+        """
+        used = {entry.get("segment") for entry in manifest.values()}
+        for name in os.listdir(self.path("segments")):
+            if name not in used:
+                shutil.rmtree(self.path("segments", name), ignore_errors=True)
+        shutil.rmtree(self.path("passages"), ignore_errors=True)
+        for name in (
+            "vocabulary.json",
+            "passages.json",
+            "postings_docs.npy",
+            "postings_tf.npy",
+            "passage_lengths.npy",
+        ):
+            if os.path.exists(self.path(name)):
+                os.remove(self.path(name))
+
+    def search(self, query, limit=10):
+        """
+        Search the manuals with BM25 ranking.
+
+        Args:
+            query (str): The search query.
+            limit (int, optional): The maximum number of results.
+
+        Returns:
+            list: The best passages, each a dictionary with the 'file', 'page', 'text' and 'score'.
+        """
+        state = self.state
+        passage_count = state["passage_count"]
+        terms = set(tokenize(query))
+        if not passage_count or not terms:
+            return []
+
+        keys = np.array(sorted(term.encode("ascii") for term in terms))
+        matches = []
+        document_frequency = dict.fromkeys(keys.tolist(), 0)
+        for segment in state["segments"]:
+            found = find_terms(segment, keys)
+            for term, (start, end) in found.items():
+                document_frequency[term] += end - start
+            if found:
+                matches.append((segment, found))
+
+        results = []
+        for segment, found in matches:
+            scores = np.zeros(len(segment["passage_lengths"]), dtype=np.float32)
+            for term, (start, end) in found.items():
+                df = document_frequency[term]
+                docs = segment["postings_docs"][start:end]
+                tf = segment["postings_tf"][start:end].astype(np.float32)
+                idf = math.log(1 + (passage_count - df + 0.5) / (df + 0.5))
+                lengths = segment["passage_lengths"][docs]
+                norm = self.k1 * (1 - self.b + self.b * lengths / state["average_length"])
+                scores[docs] += idf * tf * (self.k1 + 1) / (tf + norm)
+            top = np.flatnonzero(scores)
+            if len(top) > limit:
+                top = top[np.argpartition(-scores[top], limit - 1)[:limit]]
+            results.extend((float(scores[i]), segment, int(i)) for i in top)
+
+        results.sort(key=lambda result: (-result[0], result[1]["file"], result[2]))
+        return [
+            {
+                "file": segment["file"],
+                "page": int(segment["pages"][i]),
+                "text": bytes(
+                    segment["text"][segment["text_offsets"][i] : segment["text_offsets"][i + 1]]
+                ).decode("utf-8"),
+                "score": score,
+            }
+            for score, segment, i in results[:limit]
+        ]
@@ -11,36 +11,75 @@ Date: August 23, 2023
 
 import streamlit as st
 
+from src.ports import MAX_PORTS, parse_port_ranges
 from src.utils import (
     add_item_by_option,
+    archive_items_view,
     extract_and_insert_site_details,
+    get_cached_inventory,
+    get_panel_details,
+    nearest_stock_view,
+    paged_inventory_view,
+    read_model_view,
     remove_item_by_option,
+    remove_metadata_columns,
+    select_panel,
     set_index_with_exception_handling,
 )
 
 
-def inventory_page(db):
+def inventory_page(db, watcher=None):
     """
     Display the Inventory Management System page.
 
     Args:
         db (MongoIMS): An instance of the MongoIMS class for managing inventory data.
+        watcher (InventoryWatcher, optional): The live inventory watcher; when given, sites are read from
+            its shared cache and the page reruns as soon as the viewed site changes.
 
     This page allows users to:
     - View items for a selected site, including fiber, optics, and miscellaneous items.
     - Enter details for a new site.
     - Add new items to the inventory.
     - Remove items from the inventory.
+    - Find the closest sites that have an item in stock.
+    - Archive long-zero or stale items and restore archived items, and rebuild the read model.
     """
     st.title("Inventory Management System")
     radio_option = st.sidebar.radio(
-        "Menu", options=["View Items", "Enter new site", "Add Items", "Remove Items"]
+        "Menu",
+        options=[
+            "View Items",
+            "Enter new site",
+            "Add Items",
+            "Remove Items",
+            "Find Nearby Stock",
+            "Archive",
+        ],
     )
+    get_cilis = watcher.cache.get_cilis if watcher else db.get_cilis
+    if watcher and radio_option != "View Items":
+        watcher.unsubscribe()
 
     if radio_option == "View Items":
         st.subheader("View Items")
-        cili = st.selectbox("Select Site", db.get_cilis())
-        fiber, optic, misc = db.get_inventory_from_cili(cili)
+        cili = st.selectbox("Select Site", get_cilis())
+        if st.sidebar.radio("Browse", options=["Full site", "Paged"]) == "Paged":
+            if watcher:
+                watcher.unsubscribe()
+            paged_inventory_view(db, cili)
+            return
+        if st.sidebar.checkbox("Include archived items"):
+            if watcher:
+                watcher.unsubscribe()
+            fiber, optic, misc = db.get_inventory_from_cili(cili, include_archived=True)
+        elif watcher:
+            watcher.subscribe(cili)
+            fiber, optic, misc = (
+                remove_metadata_columns(frame) for frame in watcher.cache.get(cili)
+            )
+        else:
+            fiber, optic, misc = get_cached_inventory(db, cili)
         st.write("### Fiber Inventory")
         st.dataframe(set_index_with_exception_handling(fiber, 0))
         st.write("### Optics Inventory")
@@ -54,16 +93,133 @@ def inventory_page(db):
 
     if radio_option == "Add Items":
         st.subheader("Add New Items")
-        cili = st.selectbox("Select Site", db.get_cilis())
+        cili = st.selectbox("Select Site", get_cilis())
         option = st.radio("Select Item to add: ", ("Fiber", "Optic", "Misc"))
         add_item_by_option(db, option, cili)
 
     if radio_option == "Remove Items":
         st.subheader("Remove Items")
-        cili = st.selectbox("Select Site", db.get_cilis())
+        cili = st.selectbox("Select Site", get_cilis())
         option = st.radio("Select Item to remove: ", ("Fiber", "Optic", "Misc"))
         remove_item_by_option(db, option, cili)
 
+    if radio_option == "Find Nearby Stock":
+        st.subheader("Find Nearby Stock")
+        cili = st.selectbox("Select Site", get_cilis())
+        nearest_stock_view(db, cili)
+
+    if radio_option == "Archive":
+        st.subheader("Archive Items")
+        cili = st.selectbox("Select Site", get_cilis())
+        archive_items_view(db, cili)
+        if db.use_read_model:
+            read_model_view(db)
+
+
+def port_manager_page(db):
+    """
+    Display the Port Manager page.
+
+    Args:
+        db (MongoIMS): An instance of the MongoIMS class for managing inventory data.
+
+    This page allows users to:
+    - View the panels of a site and the assignments of their ports.
+    - Enter details for a new patch panel or switch panel.
+    - Assign the next N contiguous free ports, or specific ports, to a circuit.
+    - Release assigned ports.
+    """
+    st.title("Port Manager")
+    radio_option = st.sidebar.radio(
+        "Menu", options=["View Ports", "Add Panel", "Assign Ports", "Release Ports"]
+    )
+    cili = st.selectbox("Select Site", db.get_cilis())
+
+    if radio_option == "View Ports":
+        st.subheader("View Ports")
+        st.write("### Panels")
+        st.dataframe(set_index_with_exception_handling(db.get_port_panels(cili), 0))
+        device, panel = select_panel(db, cili)
+        if device is not None:
+            st.write("### Assigned Ports")
+            st.dataframe(
+                set_index_with_exception_handling(
+                    db.get_port_assignments(cili, device, panel), 0
+                )
+            )
+
+    if radio_option == "Add Panel":
+        st.subheader("Enter Panel details")
+        device, panel, port_count = get_panel_details()
+        if st.button("Add"):
+            if not db.check_panel(cili, device, panel):
+                db.add_port_panel(cili, device, panel, port_count)
+                st.success("Table Update!")
+            else:
+                st.write("Panel already exists.")
+
+    if radio_option == "Assign Ports":
+        st.subheader("Assign Ports")
+        label = st.text_input("Enter Circuit ID: ").upper().strip()
+        mode = st.radio("Assign: ", ("Next free ports", "Specific ports"))
+        if mode == "Next free ports":
+            count = st.number_input("Number of contiguous ports: ", 1, MAX_PORTS, 1)
+            device = st.text_input("Only on Device (optional): ").upper()
+            if st.button("Assign", disabled=not label):
+                run = db.allocate_ports(cili, int(count), label, device or None)
+                if run:
+                    st.success(
+                        f"Assigned ports {run['ports'][0]}-{run['ports'][-1]} "
+                        f"on {run['device']} / {run['panel']}."
+                    )
+                else:
+                    st.write("No panel has enough contiguous free ports.")
+        else:
+            device, panel = select_panel(db, cili)
+            ports = parse_port_ranges(st.text_input("Enter ports (e.g. 1-12, 15): "))
+            if device is not None and st.button("Assign", disabled=not label):
+                if ports and db.assign_ports(cili, device, panel, ports, label):
+                    st.success("Table Update!")
+                else:
+                    st.write("Ports could not be assigned.")
+
+    if radio_option == "Release Ports":
+        st.subheader("Release Ports")
+        device, panel = select_panel(db, cili)
+        ports = parse_port_ranges(st.text_input("Enter ports (e.g. 1-12, 15): "))
+        if device is not None and st.button("Release"):
+            if ports and db.release_ports(cili, device, panel, ports):
+                st.success("Table Update!")
+            else:
+                st.write("Ports could not be released.")
+
+
+def chat_bot_page(index):
+    """
+    Display the Chat Bot page, searching the equipment manuals offline.
+
+    Args:
+        index (ManualIndex): The index of the equipment manuals.
+
+    This page allows users to:
+    - Search the PDF and text manuals for a question or an error message.
+    - Re-index the manuals directory after adding or updating manuals.
+    """
+    st.title("Chat Bot")
+    st.sidebar.write(f"{index.passage_count()} passages indexed.")
+    if st.sidebar.button("Re-index manuals"):
+        updated = index.update()
+        st.sidebar.success(f"{updated} manuals re-indexed.")
+
+    query = st.text_input("Ask the manuals: ")
+    if query:
+        results = index.search(query)
+        if not results:
+            st.write("No matching passages found.")
+        for result in results:
+            st.write(f"### {result['file']} - page {result['page']}")
+            st.write(result["text"])
+
 
 def home_page():
     """
@@ -0,0 +1,128 @@
+"""
+Port Bitmaps - Port Occupancy Helpers for the Port Manager
+
+This script contains the functions used to store and query the port occupancy of patch panels and switches.
+The used ports of a panel are kept as a bitmap (bit 0 is port 1) stored as bytes in MongoDB and handled as a
+Python integer in memory, so that finding N contiguous free ports and bulk assigning or releasing ports are a
+handful of integer operations regardless of the number of ports.
+"""
+
+MAX_PORTS = 4096
+
+
+def bitmap_from_bytes(data):
+    """
+    Load a port bitmap stored in MongoDB.
+
+    Args:
+        data (bytes): The stored bitmap, little-endian.
+
+    Returns:
+        int: The bitmap, bit i set when port i + 1 is used.
+    """
+    return int.from_bytes(bytes(data or b""), "little")
+
+
+def bitmap_to_bytes(bitmap, port_count):
+    """
+    Convert a port bitmap to bytes for storage in MongoDB.
+
+    Args:
+        bitmap (int): The bitmap, bit i set when port i + 1 is used.
+        port_count (int): The number of ports of the panel.
+
+    Returns:
+        bytes: The bitmap, little-endian.
+    """
+    return bitmap.to_bytes((port_count + 7) // 8, "little")
+
+
+def ports_to_bitmap(ports):
+    """
+    Build the bitmap of a list of port numbers.
+
+    Args:
+        ports (iterable): Port numbers, starting at 1.
+
+    Returns:
+        int: The bitmap with the bits of the given ports set.
+    """
+    bitmap = 0
+    for port in ports:
+        bitmap |= 1 << (port - 1)
+    return bitmap
+
+
+def bitmap_to_ports(bitmap):
+    """
+    List the port numbers set in a bitmap.
+
+    Args:
+        bitmap (int): The bitmap.
+
+    Returns:
+        list: The port numbers, starting at 1, in ascending order.
+    """
+    ports = []
+    while bitmap:
+        low_bit = bitmap & -bitmap
+        ports.append(low_bit.bit_length())
+        bitmap ^= low_bit
+    return ports
+
+
+def find_free_run(used, port_count, count):
+    """
+    Find the first run of contiguous free ports.
+
+    Args:
+        used (int): The bitmap of used ports.
+        port_count (int): The number of ports of the panel.
+        count (int): The number of contiguous free ports needed.
+
+    Returns:
+        int: The first port of the run, or None if the panel has no such run.
+
+    Note:
+        Runs are found by repeatedly AND-ing the free bitmap with a shifted copy of itself, doubling the
+        run length covered each time, which takes O(log count) integer operations.
+    """
+    if count < 1 or count > port_count:
+        return None
+    runs = ~used & ((1 << port_count) - 1)
+    covered = 1
+    while covered < count and runs:
+        step = min(covered, count - covered)
+        runs &= runs >> step
+        covered += step
+    if not runs:
+        return None
+    return (runs & -runs).bit_length()
+
+
+def parse_port_ranges(text):
+    """
+    Parse a list of ports and port ranges such as "1-12, 15, 20-24".
+
+    Args:
+        text (str): The ports to parse.
+
+    Returns:
+        list: The port numbers, or None if the text is not valid or a port is outside 1 to MAX_PORTS.
+    """
+    ports = []
+    try:
+        for part in text.replace(" ", "").split(","):
+            if not part:
+                continue
+            if "-" in part:
+                first, last = (int(port) for port in part.split("-", 1))
+            else:
+                first = last = int(part)
+            if first < 1 or last > MAX_PORTS or first > last:
+                raise ValueError(part)
+            ports.extend(range(first, last + 1))
+    except ValueError:
+        print(f"Error: Invalid port list '{text}'.")
+        return None
+    return ports
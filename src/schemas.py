@@ -41,6 +41,29 @@ optic_schema = {
 
 misc_schema = {"brand": str, "item": str, "quantity": int, "site_cili": str}
 
+panel_schema = {"device": str, "panel": str, "port_count": int, "site_cili": str}
+
+inventory_categories = ("fiber", "optic", "misc")
+
+metadata_columns = ("_id", "site_cili", "version", "updated_at")
+
+inventory_filter_fields = {
+    "fiber": {"type": ["type"], "connector": ["conn1", "conn2"]},
+    "optic": {
+        "type": ["type"],
+        "speed": ["broadband"],
+        "wavelength": ["wavelength"],
+        "brand": ["make"],
+    },
+    "misc": {"brand": ["brand"], "item": ["item"]},
+}
+
+inventory_sort_fields = {
+    "fiber": ["type", "length", "quantity"],
+    "optic": ["make", "broadband", "quantity"],
+    "misc": ["brand", "item", "quantity"],
+}
+
 page_bg_img = f"""
 <style>
 [data-testid="stAppViewContainer"] > .main {{
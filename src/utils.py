@@ -14,7 +14,18 @@ import pandas as pd
 import pymongo
 import streamlit as st
 
-from src.schemas import fiber_schema, misc_schema, optic_schema, site_schema
+from src.ports import MAX_PORTS
+from src.schemas import (
+    fiber_schema,
+    inventory_categories,
+    inventory_filter_fields,
+    inventory_sort_fields,
+    metadata_columns,
+    misc_schema,
+    optic_schema,
+    panel_schema,
+    site_schema,
+)
 
 
 def check_connectors(con_1, con_2):
@@ -53,6 +64,87 @@ def remove_columns(df, cols):
     return df
 
 
+def remove_metadata_columns(df):
+    """
+    Remove the bookkeeping columns ('_id', 'site_cili', 'version', 'updated_at') present in a DataFrame.
+
+    Args:
+        df (pd.DataFrame): The DataFrame to modify.
+
+    Returns:
+        pd.DataFrame: The modified DataFrame without metadata columns.
+    """
+    return remove_columns(df, [col for col in metadata_columns if col in df.columns])
+
+
+def select_newer_rows(df, changes):
+    """
+    Select the changed rows that are not cached yet or newer than the cached row with the same '_id'.
+
+    Args:
+        df (pd.DataFrame): The cached DataFrame, including the '_id' and 'version' columns.
+        changes (pd.DataFrame): The changed rows, including the '_id' and 'version' columns.
+
+    Returns:
+        pd.DataFrame: The changed rows with a higher 'version' than the cached ones.
+    """
+    if changes.empty or df.empty:
+        return changes
+    if "version" not in df or "version" not in changes:
+        return changes[~changes["_id"].isin(df["_id"])]
+    cached = dict(zip(df["_id"], df["version"].fillna(0)))
+    newer = [
+        document_id not in cached or version > cached[document_id]
+        for document_id, version in zip(changes["_id"], changes["version"].fillna(0))
+    ]
+    return changes[newer]
+
+
+def patch_inventory_frame(df, changes, removed_ids=()):
+    """
+    Patch a cached inventory DataFrame with changed and removed rows.
+
+    Args:
+        df (pd.DataFrame): The cached DataFrame, including the '_id' and 'version' columns.
+        changes (pd.DataFrame): The changed rows, including the '_id' and 'version' columns.
+        removed_ids (list, optional): The '_id' values of rows removed (archived) from the inventory.
+
+    Returns:
+        pd.DataFrame: The DataFrame with changed rows replaced, new rows appended and removed rows dropped.
+
+    Note:
+        A cached row is only replaced by a row with a higher version, so re-reading older rows
+        (the catch-up window, or a lagging secondary) never rolls the cache back.
+    """
+    changes = select_newer_rows(df, changes)
+    if not changes.empty:
+        if df.empty:
+            df = changes.reset_index(drop=True)
+        else:
+            df = df[~df["_id"].isin(changes["_id"])]
+            df = pd.concat([df, changes], ignore_index=True)
+    if len(removed_ids) and not df.empty:
+        df = df[~df["_id"].isin(removed_ids)].reset_index(drop=True)
+    return df
+
+
+def has_inventory_changes(df, changes, removed_ids=()):
+    """
+    Check whether changed and removed rows differ from a cached inventory DataFrame.
+
+    Args:
+        df (pd.DataFrame): The cached DataFrame, including the '_id' and 'version' columns.
+        changes (pd.DataFrame): The changed rows, including the '_id' and 'version' columns.
+        removed_ids (list, optional): The '_id' values of rows removed (archived) from the inventory.
+
+    Returns:
+        bool: True if patch_inventory_frame would change the cached DataFrame.
+    """
+    if len(removed_ids) and not df.empty and df["_id"].isin(removed_ids).any():
+        return True
+    return not select_newer_rows(df, changes).empty
+
+
 def set_index_with_exception_handling(df, index):
     """
     Set the index of a DataFrame to the specified column with exception handling.
@@ -85,7 +177,133 @@ def convert_to_dataframe(_collection, data):
     return pd.DataFrame(list(_collection.find(data)))
 
 
-def insert_data(collection, category, data):
+def build_inventory_query(category, cili, filters=None):
+    """
+    Build the MongoDB query selecting the inventory items of a site that match the given filters.
+
+    Args:
+        category (str): The category of the items ('fiber', 'optic', 'misc').
+        cili (str): The CILI value of the site, or None to match items of every site.
+        filters (dict, optional): Filter values keyed by filter name ('type', 'connector', 'speed',
+            'wavelength', 'brand', 'item'). Filters that do not apply to the category or are None are ignored.
+
+    Returns:
+        dict: The MongoDB query.
+    """
+    conditions = [] if cili is None else [{"site_cili": cili}]
+    for name, value in (filters or {}).items():
+        fields = inventory_filter_fields[category].get(name)
+        if not fields or value is None:
+            continue
+        if len(fields) == 1:
+            conditions.append({fields[0]: value})
+        else:
+            conditions.append({"$or": [{field: value} for field in fields]})
+    if not conditions:
+        return {}
+    if len(conditions) == 1:
+        return conditions[0]
+    return {"$and": conditions}
+
+
+def build_location(latitude, longitude):
+    """
+    Build the GeoJSON point stored as the location of a site.
+
+    Args:
+        latitude (float): The latitude of the site, in degrees.
+        longitude (float): The longitude of the site, in degrees.
+
+    Returns:
+        dict: The GeoJSON point, or None if the coordinates are missing or out of range.
+    """
+    if latitude is None or longitude is None:
+        return None
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        print("Error: Site coordinates out of range.")
+        return None
+    return {"type": "Point", "coordinates": [longitude, latitude]}
+
+
+def parse_coordinate(text):
+    """
+    Parse a latitude or longitude entered by the user.
+
+    Args:
+        text (str): The coordinate in decimal degrees.
+
+    Returns:
+        float: The coordinate, or None if the text is empty or not a number.
+    """
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def build_page_cursor_query(sort_field, cursor, descending=False):
+    """
+    Build the MongoDB query selecting the documents that come after a page cursor.
+
+    Args:
+        sort_field (str): The field the documents are sorted by ('_id' breaks ties).
+        cursor (tuple): The sort value and '_id' of the last document of the previous page.
+        descending (bool, optional): Whether the documents are sorted in descending order.
+
+    Returns:
+        dict: The MongoDB query.
+    """
+    value, last_id = cursor
+    operator = "$lt" if descending else "$gt"
+    return {
+        "$or": [
+            {sort_field: {operator: value}},
+            {sort_field: value, "_id": {operator: last_id}},
+        ]
+    }
+
+
+def build_site_inventory(cili, lines):
+    """
+    Build the denormalized inventory document of a site.
+
+    Args:
+        cili (str): The CILI value of the site.
+        lines (dict): Inventory documents of the site keyed by category ('fiber', 'optic', 'misc').
+
+    Returns:
+        dict: A document holding the embedded lines of every category and their totals.
+    """
+    document = {"cili": cili, "totals": {}, "version": 0}
+    for category in inventory_categories:
+        category_lines = lines.get(category, [])
+        document[category] = category_lines
+        document["totals"][category] = {
+            "lines": len(category_lines),
+            "quantity": sum(line.get("quantity", 0) for line in category_lines),
+        }
+        document["version"] = max(
+            [document["version"]] + [line.get("version", 0) for line in category_lines]
+        )
+    return document
+
+
+def site_inventory_to_dataframes(document):
+    """
+    Convert a denormalized site inventory document to Pandas DataFrames.
+
+    Args:
+        document (dict): The site inventory document.
+
+    Returns:
+        tuple: A tuple containing dataframes for fiber, optic, and misc inventory.
+    """
+    return tuple(
+        pd.DataFrame(document.get(category, [])) for category in inventory_categories
+    )
+
+
+def insert_data(collection, category, data, stamp=None):
     """
     Insert data into a MongoDB collection based on the specified category.
 
@@ -93,15 +311,18 @@ def insert_data(collection, category, data):
         collection: The MongoDB collection to insert data into.
         category (str): The category of the item to insert.
         data (dict): The data to insert into the collection.
+        stamp (dict, optional): Extra fields (version stamps, port bitmaps, site location) added to the
+            document once it has been validated.
 
     Note:
         This function validates the data against the corresponding schema for the given category.
     """
+    stamp = stamp or {}
     if category == "site":
         if set(data.keys()) == set(site_schema.keys()):
             if all(isinstance(data[field], site_schema[field]) for field in data):
                 try:
-                    collection.insert_one(data)
+                    collection.insert_one({**data, **stamp})
                 except pymongo.errors.DuplicateKeyError:
                     print("Site already exists. Skipping insertion.")
             else:
@@ -111,7 +332,7 @@ def insert_data(collection, category, data):
     elif category == "fiber":
         if set(data.keys()) == set(fiber_schema.keys()):
             if all(isinstance(data[field], fiber_schema[field]) for field in data):
-                collection.insert_one(data)
+                collection.insert_one({**data, **stamp})
             else:
                 print("Invalid data types for fiber schema.")
         else:
@@ -120,7 +341,7 @@ def insert_data(collection, category, data):
     elif category == "optic":
         if set(data.keys()) == set(optic_schema.keys()):
             if all(isinstance(data[field], optic_schema[field]) for field in data):
-                collection.insert_one(data)
+                collection.insert_one({**data, **stamp})
             else:
                 print("Invalid data types for fiber schema.")
         else:
@@ -128,16 +349,27 @@ def insert_data(collection, category, data):
     elif category == "misc":
         if set(data.keys()) == set(misc_schema.keys()):
             if all(isinstance(data[field], misc_schema[field]) for field in data):
-                collection.insert_one(data)
+                collection.insert_one({**data, **stamp})
             else:
                 print("Invalid data types for clothing schema.")
         else:
             print("Invalid data structure for clothing schema.")
+    elif category == "panel":
+        if set(data.keys()) == set(panel_schema.keys()):
+            if all(isinstance(data[field], panel_schema[field]) for field in data):
+                try:
+                    collection.insert_one({**data, **stamp})
+                except pymongo.errors.DuplicateKeyError:
+                    print("Panel already exists. Skipping insertion.")
+            else:
+                print("Invalid data types for panel schema.")
+        else:
+            print("Invalid data structure for panel schema.")
     else:
         print("Unknown category.")
 
 
-def update_data_quantity(collection, category, new_quantity, data):
+def update_data_quantity(collection, category, new_quantity, data, stamp=None):
     """
     Update the quantity of an item in a MongoDB collection based on the specified category.
 
@@ -146,13 +378,21 @@ def update_data_quantity(collection, category, new_quantity, data):
         category (str): The category of the item to update.
         new_quantity (int): The new quantity value.
         data (dict): The data used to identify the item for updating.
+        stamp (dict, optional): Version fields set along with the new quantity.
     """
+    stamp = stamp or {}
     if category == "fiber":
-        collection.update_one(data, {"$set": {"quantity": new_quantity}})
+        collection.update_one(
+            data, {"$set": {"quantity": new_quantity, **stamp}}
+        )
     elif category == "optic":
-        collection.update_one(data, {"$set": {"quantity": new_quantity}})
+        collection.update_one(
+            data, {"$set": {"quantity": new_quantity, **stamp}}
+        )
     elif category == "misc":
-        collection.update_one(data, {"$set": {"quantity": new_quantity}})
+        collection.update_one(
+            data, {"$set": {"quantity": new_quantity, **stamp}}
+        )
 
 
 def generate_dict_item(category, *args):
@@ -219,6 +459,13 @@ def generate_dict_item(category, *args):
             return dict_item
         except Exception as e:
             print("An error occurred:", str(e))
+    elif category == "panel":
+        fill_items = ["device", "panel", "port_count", "site_cili"]
+        try:
+            dict_item = {fill_items[i]: args[i] for i in range(len(fill_items))}
+            return dict_item
+        except Exception as e:
+            print("An error occurred:", str(e))
 
 
 def get_site_details():
@@ -234,6 +481,8 @@ def get_site_details():
         - country (str): The country where the site is located.
         - zip_code (str): The ZIP code or postal code of the site.
         - site_id (str): A unique identifier for the site.
+        - latitude (float): The latitude of the site, None if not entered.
+        - longitude (float): The longitude of the site, None if not entered.
     """
     cili = st.text_input("Enter site CILI: ").upper()
     address = st.text_input("Enter site Address: ").upper()
@@ -242,7 +491,9 @@ def get_site_details():
     country = st.text_input("Country: ").upper()
     zip_code = st.text_input("Zip Code: ").upper()
     site_id = st.text_input("Site ID: ").upper()
-    return cili, address, city, state, country, zip_code, site_id
+    latitude = parse_coordinate(st.text_input("Latitude (optional): "))
+    longitude = parse_coordinate(st.text_input("Longitude (optional): "))
+    return cili, address, city, state, country, zip_code, site_id, latitude, longitude
 
 
 def get_fiber_details():
@@ -307,6 +558,252 @@ def get_misc_details():
     return brand, item, qty
 
 
+def get_cached_inventory(database, cili):
+    """
+    Get the inventory of a site from the session cache, fetching only the rows changed since the last rerun.
+
+    The snapshot and changes are read from the primary, like the shared cache of the live watcher:
+    successive reruns on secondaries at different lag would otherwise see the site go back and forth.
+
+    Args:
+        database (MongoIMS): An instance of the MongoIMS class for managing inventory data.
+        cili (str): The CILI value of the site.
+
+    Returns:
+        tuple: A tuple containing dataframes for fiber, optic, and misc inventory.
+    """
+    cache = st.session_state.setdefault("inventory_cache", {})
+    entry = cache.get(cili)
+    if entry is None:
+        frames, version = database.get_inventory_snapshot(cili, primary=True)
+        entry = {"frames": dict(zip(inventory_categories, frames)), "version": version}
+        cache[cili] = entry
+    else:
+        changes, removed, version = database.get_inventory_changes_since(
+            cili, entry["version"], primary=True
+        )
+        for category, frame in changes.items():
+            entry["frames"][category] = patch_inventory_frame(
+                entry["frames"][category], frame, removed[category]
+            )
+        entry["version"] = version
+    return tuple(
+        remove_metadata_columns(entry["frames"][category])
+        for category in inventory_categories
+    )
+
+
+def get_inventory_filters(option):
+    """
+    Get user input for the filters of a paged inventory view.
+
+    Args:
+        option (str): The selected inventory category (e.g., 'Fiber', 'Optic', 'Misc').
+
+    Returns:
+        dict: Filter values keyed by filter name, None when a filter is not set.
+    """
+    filters = {}
+    if option in ("Fiber", "Optic"):
+        type_ = st.selectbox("Filter Fiber Type", ["ANY", "SMF", "MMF"])
+        filters["type"] = None if type_ == "ANY" else type_
+    if option == "Fiber":
+        connector = st.selectbox("Filter Connector", ["ANY", "LC", "SC"])
+        filters["connector"] = None if connector == "ANY" else connector
+    if option == "Optic":
+        speed = st.text_input("Filter Broadband Speed: ").upper()
+        filters["speed"] = speed or None
+        wavelength = st.selectbox("Filter wavelength (nm)", ["ANY", "1310", "1550"])
+        filters["wavelength"] = None if wavelength == "ANY" else wavelength
+    if option in ("Optic", "Misc"):
+        brand = st.text_input("Filter Brand: ").upper()
+        filters["brand"] = brand or None
+    if option == "Misc":
+        item = st.text_input("Filter Item: ").upper()
+        filters["item"] = item or None
+    return filters
+
+
+def paged_inventory_view(database, cili):
+    """
+    Display one category of a site's inventory a page at a time, with filtering, sorting and paging done by MongoDB.
+
+    Args:
+        database (MongoIMS): An instance of the MongoIMS class for managing inventory data.
+        cili (str): The CILI value of the site.
+    """
+    option = st.radio("Select Items to browse: ", ("Fiber", "Optic", "Misc"))
+    category = option.lower()
+    filters = get_inventory_filters(option)
+    sort_field = st.selectbox("Sort by", inventory_sort_fields[category])
+    descending = st.checkbox("Descending")
+    page_size = st.selectbox("Rows per page", [25, 50, 100, 250])
+
+    view = (cili, category, tuple(filters.items()), sort_field, descending, page_size)
+    pager = st.session_state.get("inventory_pager")
+    if pager is None or pager["view"] != view:
+        pager = {"view": view, "cursors": [None]}
+        st.session_state["inventory_pager"] = pager
+
+    frame, count, next_cursor = database.get_inventory_page(
+        category,
+        cili,
+        filters,
+        sort_field,
+        descending,
+        page_size,
+        pager["cursors"][-1],
+    )
+    page_number = len(pager["cursors"])
+    total = f"{count}+" if count >= database.count_limit else str(count)
+    st.write(f"Page {page_number} - {total} matching items")
+    st.dataframe(set_index_with_exception_handling(frame, 0))
+
+    previous_col, next_col = st.columns(2)
+    if previous_col.button("Previous", disabled=page_number == 1):
+        pager["cursors"].pop()
+        st.experimental_rerun()
+    if next_col.button("Next", disabled=next_cursor is None):
+        pager["cursors"].append(next_cursor)
+        st.experimental_rerun()
+
+
+def archive_items_view(database, cili):
+    """
+    Display the archival controls: archive long-zero or stale items and restore archived items of a site.
+
+    Args:
+        database (MongoIMS): An instance of the MongoIMS class for managing inventory data.
+        cili (str): The CILI value of the site whose archived items can be restored.
+    """
+    st.write("### Archive Items")
+    zero_days = st.number_input("Archive items at zero quantity for (days): ", 1, value=30)
+    stale = st.checkbox("Also archive items not updated for a while")
+    stale_days = st.number_input("Not updated for (days): ", 1, value=365) if stale else None
+    only_site = st.checkbox(f"Only archive items of {cili}")
+    include_legacy = st.checkbox(
+        "Also archive zero-quantity items with no recorded update time"
+    )
+    if st.button("Archive"):
+        archived = database.archive_items(
+            int(zero_days),
+            int(stale_days) if stale_days else None,
+            cili if only_site else None,
+            include_legacy,
+        )
+        st.success(
+            ", ".join(f"{count} {category}" for category, count in archived.items())
+            + " items archived."
+        )
+
+    st.write("### Restore Items")
+    option = st.radio("Select Items to restore: ", ("Fiber", "Optic", "Misc"))
+    archived = database.get_archived_items(option.lower(), cili)
+    if archived.empty:
+        st.write("No archived items.")
+        return
+    labels = {
+        document_id: " / ".join(str(value) for value in row.values)
+        for document_id, row in remove_metadata_columns(archived)
+        .set_index(archived["_id"])
+        .iterrows()
+    }
+    selected = st.multiselect(
+        "Select archived items", list(labels), format_func=labels.get
+    )
+    if st.button("Restore", disabled=not selected):
+        database.restore_items(option.lower(), selected)
+        st.success("Table Update!")
+
+
+def read_model_view(database):
+    """
+    Display the read model controls: rebuild the site inventory documents from the category collections.
+
+    Args:
+        database (MongoIMS): An instance of the MongoIMS class for managing inventory data.
+    """
+    st.write("### Read Model")
+    st.write(
+        "Rebuild the site inventory documents served by View Items, e.g. after the read model "
+        "was turned off and on again."
+    )
+    if st.button("Rebuild site inventories"):
+        st.success(f"{database.rebuild_site_inventories()} site inventories rebuilt.")
+
+
+def get_panel_details():
+    """
+    Get user input for patch panel or switch details.
+
+    Returns:
+        tuple: A tuple containing the following details:
+        - device (str): Name of the rack device (e.g., patch panel, switch).
+        - panel (str): Name of the panel or module on the device.
+        - port_count (int): Number of ports on the panel.
+    """
+    device = st.text_input("Enter Device: ").upper()
+    panel = st.text_input("Enter Panel: ").upper()
+    port_count = st.number_input("Number of ports: ", 1, MAX_PORTS, 48)
+    return device, panel, int(port_count)
+
+
+def select_panel(database, cili):
+    """
+    Get user selection of one of the panels of a site.
+
+    Args:
+        database (MongoIMS): An instance of the MongoIMS class for managing inventory data.
+        cili (str): The CILI value of the site.
+
+    Returns:
+        tuple: The device and panel names, or (None, None) if the site has no panels.
+    """
+    panels = database.get_port_panels(cili)
+    if panels.empty:
+        st.write("No panels at this site.")
+        return None, None
+    options = list(zip(panels["device"], panels["panel"]))
+    return st.selectbox(
+        "Select Panel", options, format_func=lambda option: " / ".join(option)
+    )
+
+
+def nearest_stock_view(database, cili):
+    """
+    Display the sites closest to a site that have an item in stock.
+
+    Args:
+        database (MongoIMS): An instance of the MongoIMS class for managing inventory data.
+        cili (str): The CILI value of the site looking for stock.
+    """
+    site = database.check_site(cili) or {}
+    if "location" not in site:
+        st.write("This site has no location yet.")
+        latitude = parse_coordinate(st.text_input("Latitude: "))
+        longitude = parse_coordinate(st.text_input("Longitude: "))
+        if st.button("Save location"):
+            if database.set_site_location(cili, latitude, longitude):
+                st.success("Table Update!")
+                st.experimental_rerun()
+            else:
+                st.write("Invalid coordinates.")
+        return
+
+    option = st.radio("Select Item to find: ", ("Fiber", "Optic", "Misc"))
+    filters = get_inventory_filters(option)
+    radius_km = st.number_input("Search radius (km): ", 1, 20000, 50)
+    min_quantity = st.number_input("Minimum quantity: ", 1, value=1)
+    if st.button("Find"):
+        stock = database.find_nearest_stock(
+            option.lower(), filters, cili, int(radius_km), int(min_quantity)
+        )
+        if stock.empty:
+            st.write("No nearby site has this item in stock.")
+        else:
+            st.dataframe(set_index_with_exception_handling(stock, 0))
+
+
 def add_item_by_option(database, option, cili):
     """
     Add an item to the inventory based on the user's selection.
@@ -453,12 +950,31 @@ def extract_and_insert_site_details(database):
     Args:
         database (MongoIMS): An instance of the MongoIMS class for managing inventory data.
     """
-    cili, address, city, state, country, zip_code, site_id = get_site_details()
+    (
+        cili,
+        address,
+        city,
+        state,
+        country,
+        zip_code,
+        site_id,
+        latitude,
+        longitude,
+    ) = get_site_details()
 
     if st.button("Add"):
         if not database.check_site(cili):
             database.insert_collection_data(
-                "site", cili, address, city, state, country, zip_code, site_id
+                "site",
+                cili,
+                address,
+                city,
+                state,
+                country,
+                zip_code,
+                site_id,
+                latitude,
+                longitude,
             )
             st.success("Table Update!")
         else: